@@ -37,12 +37,140 @@ SOFTWARE.
 """
 
 import cv2
+import numpy as np
 from datetime import datetime
 import os
+import re
+import subprocess
+import sys
+import time
+
+# フォント設定
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+FONT_SCALE = 0.7
+THICKNESS = 2
+PADDING = 10
+
+# 操作説明（プレビューのみに表示）
+INSTRUCTION_TEXT = "SPACE: Start/Stop Recording | Q: Quit"
+INSTRUCTION_FONT_SCALE = 0.6
+
+def open_camera(index):
+    """OSに合ったバックエンドで低遅延の設定をしたウェブカメラを開く"""
+    if sys.platform.startswith('win'):
+        backend = cv2.CAP_DSHOW
+    elif sys.platform == 'darwin':
+        backend = cv2.CAP_AVFOUNDATION
+    else:
+        backend = cv2.CAP_V4L2
+    
+    cap = cv2.VideoCapture(index, backend)
+    if not cap.isOpened():
+        # 指定したバックエンドが使えない場合は自動選択に任せる
+        cap = cv2.VideoCapture(index)
+    
+    # バッファを1フレームにして遅延を減らし、MJPGでUSBの帯域を抑える
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
+    cap.set(cv2.CAP_PROP_FPS, 30)
+    return cap
+
+def hardware_encoder_pipelines(filename):
+    """OSごとのハードウェアエンコーダを使うGStreamerパイプラインの候補を返す"""
+    if sys.platform == 'darwin':
+        encoders = ['vtenc_h264_hw']
+    elif sys.platform.startswith('linux'):
+        encoders = ['nvh264enc', 'vaapih264enc']
+    else:
+        encoders = []
+    
+    return [(encoder,
+             f"appsrc ! videoconvert ! {encoder} ! h264parse ! mp4mux ! filesink location={filename}")
+            for encoder in encoders]
+
+def open_video_writer(filename, fps, size):
+    """ハードウェアエンコーダで録画用のVideoWriterを開く（使えなければmp4vを使う）
+    
+    pipで入れたOpenCVはGStreamerに対応していないことが多いので、
+    次にFFmpegバックエンドのハードウェアアクセラレーションを試す。
+    """
+    # OpenCVがGStreamer対応でビルドされている場合のみハードウェアエンコーダを試す
+    if re.search(r'GStreamer:\s*YES', cv2.getBuildInformation()):
+        for encoder, pipeline in hardware_encoder_pipelines(filename):
+            writer = cv2.VideoWriter(pipeline, cv2.CAP_GSTREAMER, 0, fps, size)
+            if writer.isOpened():
+                return writer, encoder
+            writer.release()
+    
+    # FFmpegバックエンドにハードウェアエンコーダを選ばせる（OpenCV 4.5.2以降）
+    if hasattr(cv2, 'VIDEOWRITER_PROP_HW_ACCELERATION'):
+        writer = cv2.VideoWriter(filename, cv2.CAP_FFMPEG, cv2.VideoWriter_fourcc(*'avc1'), fps, size,
+                                 [cv2.VIDEOWRITER_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY])
+        # ソフトウェアのH.264になった場合はmp4vの方が軽いので使わない
+        if writer.isOpened() and writer.get(cv2.VIDEOWRITER_PROP_HW_ACCELERATION) > cv2.VIDEO_ACCELERATION_NONE:
+            return writer, 'ffmpeg (hw)'
+        writer.release()
+    
+    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+    return cv2.VideoWriter(filename, fourcc, fps, size), 'mp4v'
+
+class RawVideoWriter:
+    """フレームを無圧縮のまま書き出し、release()時にffmpegでmp4にエンコードするVideoWriter互換クラス
+    
+    録画中のCPU負荷をエンコードの分だけ下げる代わりに、ディスクの帯域と容量を使う。
+    エンコードはバックグラウンドで行い、wait()で終了を待つ。
+    """
+    
+    def __init__(self, filename, fps, size):
+        self.filename = filename
+        self.raw_filename = os.path.splitext(filename)[0] + ".bgr"
+        self.fps = fps
+        self.size = size
+        self.raw_file = open(self.raw_filename, 'wb')
+        self.process = None
+    
+    def write(self, frame):
+        self.raw_file.write(frame.data)
+    
+    def release(self):
+        if self.raw_file is None:
+            return
+        self.raw_file.close()
+        self.raw_file = None
+        
+        width, height = self.size
+        command = ["ffmpeg", "-y", "-loglevel", "error",
+                   "-f", "rawvideo", "-pix_fmt", "bgr24",
+                   "-s", f"{width}x{height}", "-r", str(self.fps),
+                   "-i", self.raw_filename,
+                   "-c:v", "libx264", "-preset", "faster", "-crf", "21",
+                   "-pix_fmt", "yuv420p", self.filename]
+        print(f"エンコード開始: {self.raw_filename} -> {self.filename}")
+        try:
+            # プレビューを止めないように、終了を待たずに戻る（キー入力を奪わないよう標準入力は渡さない）
+            self.process = subprocess.Popen(command, stdin=subprocess.DEVNULL)
+        except FileNotFoundError:
+            print(f"エラー: ffmpegが見つかりません。無圧縮のファイルを残します: {self.raw_filename}")
+    
+    def wait(self):
+        """release()で始めたエンコードの終了を待ち、成功したら無圧縮のファイルを削除する"""
+        if self.process is None:
+            return
+        returncode = self.process.wait()
+        self.process = None
+        
+        if returncode != 0:
+            print(f"エラー: エンコードに失敗しました。無圧縮のファイルを残します: {self.raw_filename}")
+            return
+        os.remove(self.raw_filename)
+        print(f"エンコード完了: {self.filename}")
 
 def main():
+    # 起動オプション: --raw で録画中はエンコードせず、停止後にまとめてエンコードする
+    raw_mode = '--raw' in sys.argv[1:]
+    
     # ウェブカメラの初期化
-    cap = cv2.VideoCapture(1)
+    cap = open_camera(1)
     
     if not cap.isOpened():
         print("エラー: カメラを開けません")
@@ -77,6 +205,8 @@ def main():
     print(f"カメラ報告FPS: {reported_fps}")
     print(f"実測FPS: {measured_fps:.2f}")
     print(f"使用FPS: {fps}")
+    if raw_mode:
+        print("録画モード: RAW（停止後にffmpegでエンコード）")
     print("\n操作方法:")
     print("  SPACE: 録画開始/停止")
     print("  q: 終了")
@@ -86,8 +216,60 @@ def main():
     is_recording = False
     video_writer = None
     recording_start_time = None
+    recording_start_ns = None  # 経過時間の計算用（time.monotonic_ns()）
     output_filename = None
     recording_frame_number = 0
+    encoding_writers = []  # --raw のときにエンコード中のRawVideoWriter
+    
+    # テキストの大きさはフレームごとに変わらないので、ループの前に一度だけ計算する
+    # フレーム番号は十分大きな桁数、タイムスタンプは固定長の書式で見積もる
+    (frame_text_width, frame_text_height), _ = cv2.getTextSize("Frame: 9999999", FONT, FONT_SCALE, THICKNESS)
+    (time_text_width, time_text_height), _ = cv2.getTextSize("0000-00-00 00:00:00.000", FONT, FONT_SCALE, THICKNESS)
+    
+    # 最も幅の広いテキストを基準に背景の幅を決定
+    max_text_width = max(frame_text_width, time_text_width)
+    
+    # 左下の位置を計算
+    y_bottom = height - 5
+    total_height = frame_text_height + time_text_height + PADDING * 3
+    
+    # フレーム番号とタイムスタンプのパネル（背景の矩形と"Frame: "はあらかじめ描画しておく）
+    # 毎フレーム、数字だけを描き足してフレームの左下にまとめてコピーする
+    panel_left = 5
+    panel_top = y_bottom - total_height
+    panel_background = np.zeros((total_height + 1, max_text_width + PADDING * 2 + 1, 3), dtype=np.uint8)
+    panel = np.empty_like(panel_background)
+    frame_text_y = total_height - time_text_height - PADDING * 2
+    timestamp_text_y = total_height - PADDING
+    
+    frame_prefix = "Frame: "
+    # getTextSizeの幅には線の太さが含まれるので、後ろに"0"を並べた幅の差から送り幅を求める
+    (prefix_with_digit_width, _), _ = cv2.getTextSize(frame_prefix + "0", FONT, FONT_SCALE, THICKNESS)
+    (digit_width, _), _ = cv2.getTextSize("0", FONT, FONT_SCALE, THICKNESS)
+    frame_prefix_width = prefix_with_digit_width - digit_width
+    cv2.putText(panel_background, 
+               frame_prefix, 
+               (PADDING, frame_text_y), 
+               FONT, 
+               FONT_SCALE, 
+               (255, 255, 0),  # 黄色
+               THICKNESS)
+    
+    # 操作説明はフレームの下端の帯に一度だけ描画しておく
+    (_, instruction_height), _ = cv2.getTextSize(
+        INSTRUCTION_TEXT, FONT, INSTRUCTION_FONT_SCALE, THICKNESS)
+    instruction_top = max(height - 15 - instruction_height - THICKNESS, 0)
+    instruction_overlay = np.zeros((height - instruction_top, width, 3), dtype=np.uint8)
+    cv2.putText(instruction_overlay, 
+               INSTRUCTION_TEXT, 
+               (10, height - 15 - instruction_top), 
+               FONT, 
+               INSTRUCTION_FONT_SCALE, 
+               (255, 255, 255), 
+               THICKNESS)
+    
+    # 反転用のバッファ（毎フレームの確保を避ける）
+    flip_buf = np.empty((height, width, 3), dtype=np.uint8)
     
     while True:
         ret, frame = cap.read()
@@ -103,59 +285,39 @@ def main():
         current_time = datetime.now()
         timestamp_str = current_time.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
         
-        # フレームを反転（鏡のように）
-        frame = cv2.flip(frame, 1)
-        
-        # フォント設定
-        font = cv2.FONT_HERSHEY_SIMPLEX
-        font_scale = 0.7
-        thickness = 2
-        padding = 10
-        
-        # フレーム番号のテキスト
-        frame_text = f"Frame: {recording_frame_number}"
-        (frame_text_width, frame_text_height), _ = cv2.getTextSize(frame_text, font, font_scale, thickness)
-        
-        # タイムスタンプのテキスト
-        timestamp_text = timestamp_str
-        (time_text_width, time_text_height), _ = cv2.getTextSize(timestamp_text, font, font_scale, thickness)
+        # フレームを反転（鏡のように、確保済みのバッファに書き込む）
+        # 実際のフレームの大きさがバッファと違うとOpenCVが確保し直すので、戻り値を次のバッファにする
+        flip_buf = cv2.flip(frame, 1, dst=flip_buf)
+        frame = flip_buf
         
-        # 最も幅の広いテキストを基準に背景の幅を決定
-        max_text_width = max(frame_text_width, time_text_width)
-        
-        # 左下の位置を計算
-        y_bottom = height - 5
-        
-        # 背景の矩形を描画（フレーム番号とタイムスタンプの両方を含む）
-        total_height = frame_text_height + time_text_height + padding * 3
-        cv2.rectangle(frame, 
-                     (5, y_bottom - total_height), 
-                     (5 + max_text_width + padding * 2, y_bottom), 
-                     (0, 0, 0), 
-                     -1)
+        # パネルを背景から作り直す
+        np.copyto(panel, panel_background)
         
         # フレーム番号を描画（上側）
-        cv2.putText(frame, 
-                   frame_text, 
-                   (5 + padding, y_bottom - time_text_height - padding * 2), 
-                   font, 
-                   font_scale, 
+        cv2.putText(panel, 
+                   str(recording_frame_number), 
+                   (PADDING + frame_prefix_width, frame_text_y), 
+                   FONT, 
+                   FONT_SCALE, 
                    (255, 255, 0),  # 黄色
-                   thickness)
+                   THICKNESS)
         
         # タイムスタンプを描画（下側）
-        cv2.putText(frame, 
-                   timestamp_text, 
-                   (5 + padding, y_bottom - padding), 
-                   font, 
-                   font_scale, 
+        cv2.putText(panel, 
+                   timestamp_str, 
+                   (PADDING, timestamp_text_y), 
+                   FONT, 
+                   FONT_SCALE, 
                    (0, 255, 0),  # 緑
-                   thickness)
+                   THICKNESS)
+        
+        # パネルをフレームの左下にコピー
+        frame[panel_top:panel_top + panel.shape[0], panel_left:panel_left + panel.shape[1]] = panel
         
         # 録画中の場合
         if is_recording:
             # 録画時間を計算
-            elapsed_time = (current_time - recording_start_time).total_seconds()
+            elapsed_time = (time.monotonic_ns() - recording_start_ns) / 1e9
             elapsed_str = f"REC: {int(elapsed_time // 60):02d}:{int(elapsed_time % 60):02d}"
             
             # 録画インジケーターを描画（右上）
@@ -164,28 +326,22 @@ def main():
             cv2.putText(frame, 
                        elapsed_str, 
                        (width - 150, 40), 
-                       font, 
-                       0.7, 
+                       FONT, 
+                       FONT_SCALE, 
                        (0, 0, 255), 
-                       2)
+                       THICKNESS)
             
             # フレームを書き込み
             video_writer.write(frame)
         
         # プレビュー表示
-        display_frame = frame.copy()
+        # 録画用のフレームは書き込み済みなので、コピーせずにそのまま操作説明を重ねる
         
-        # 操作説明を表示（下部）
-        instruction = "SPACE: Start/Stop Recording | Q: Quit"
-        cv2.putText(display_frame, 
-                   instruction, 
-                   (10, height - 15), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 
-                   0.6, 
-                   (255, 255, 255), 
-                   2)
+        # 操作説明を重ねる（下部、描画済みの帯を加算するだけ）
+        instruction_roi = frame[instruction_top:]
+        cv2.add(instruction_roi, instruction_overlay, dst=instruction_roi)
         
-        cv2.imshow('Camera Recording', display_frame)
+        cv2.imshow('Camera Recording', frame)
         
         # キー入力処理
         key = cv2.waitKey(1) & 0xFF
@@ -197,37 +353,52 @@ def main():
                 # 録画開始
                 recording_frame_number = 0  # フレーム番号をリセット
                 recording_start_time = datetime.now()
+                recording_start_ns = time.monotonic_ns()
                 timestamp_for_filename = recording_start_time.strftime("%Y%m%d_%H%M%S")
                 output_filename = f"recording_{timestamp_for_filename}.mp4"
                 
                 # VideoWriterの初期化
-                fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-                video_writer = cv2.VideoWriter(output_filename, fourcc, fps, (width, height))
+                if raw_mode:
+                    video_writer, encoder = RawVideoWriter(output_filename, fps, (width, height)), 'raw'
+                else:
+                    video_writer, encoder = open_video_writer(output_filename, fps, (width, height))
                 
                 is_recording = True
-                print(f"[{timestamp_str}] 録画開始: {output_filename}")
+                print(f"[{timestamp_str}] 録画開始: {output_filename} (エンコーダ: {encoder})")
             else:
                 # 録画停止
                 is_recording = False
                 if video_writer is not None:
                     video_writer.release()
+                    if raw_mode:
+                        encoding_writers.append(video_writer)
                     video_writer = None
                 
                 # ファイルサイズを取得
-                file_size = os.path.getsize(output_filename) / (1024 * 1024)  # MB
-                elapsed_time = (datetime.now() - recording_start_time).total_seconds()
+                elapsed_time = (time.monotonic_ns() - recording_start_ns) / 1e9
                 
                 print(f"[{timestamp_str}] 録画停止: {output_filename}")
                 print(f"  録画時間: {int(elapsed_time // 60):02d}:{int(elapsed_time % 60):02d}")
-                print(f"  ファイルサイズ: {file_size:.2f} MB")
+                # --raw のときはエンコードが終わるまでファイルサイズが確定しない
+                if not raw_mode and os.path.exists(output_filename):
+                    file_size = os.path.getsize(output_filename) / (1024 * 1024)  # MB
+                    print(f"  ファイルサイズ: {file_size:.2f} MB")
     
     # リソースの解放
     if video_writer is not None:
         video_writer.release()
+        if raw_mode:
+            encoding_writers.append(video_writer)
     
     cap.release()
     cv2.destroyAllWindows()
     
+    # バックグラウンドのエンコードが終わるまで待つ
+    if encoding_writers:
+        print("エンコードの終了を待っています...")
+    for writer in encoding_writers:
+        writer.wait()
+    
     print("\n終了しました")
 
 if __name__ == "__main__":
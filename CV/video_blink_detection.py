@@ -35,29 +35,117 @@ from mediapipe.tasks import python
 from mediapipe.tasks.python import vision
 import numpy as np
 from datetime import datetime, timedelta
-import csv
+import math
+from operator import itemgetter
 import sys
 import os
+from queue import Full, Queue
+from threading import Event, Thread
+
+# NumbaがあればEAR計算をJITコンパイルする（なければ通常のPythonで実行）
+try:
+    from numba import njit
+except ImportError:
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
 
 # 目のランドマークのインデックス
-LEFT_EYE_INDEXES = [33, 160, 158, 133, 153, 144]
-RIGHT_EYE_INDEXES = [362, 385, 387, 263, 373, 380]
+LEFT_EYE_IDX_NP = np.array([33, 160, 158, 133, 153, 144], dtype=np.int32)
+RIGHT_EYE_IDX_NP = np.array([362, 385, 387, 263, 373, 380], dtype=np.int32)
+
+# 両目分のインデックス（左目6点 + 右目6点）
+EYE_IDX_NP = np.concatenate([LEFT_EYE_IDX_NP, RIGHT_EYE_IDX_NP])
+
+# ランドマークのリストから両目の12点をまとめて取り出す（添字のループをC側で行う）
+EYE_LANDMARK_GETTER = itemgetter(*EYE_IDX_NP.tolist())
+
+# 顔検出に使う画像の最大幅の既定値（これより大きい動画は縮小してから検出する）
+# --detect-width で変更でき、0を指定すると縮小しない
+DETECTION_WIDTH = 640
+
+# JITコンパイルの準備に使う両目の座標（開いた目のおおよその形）
+WARMUP_EYE_POINTS = np.array([
+    [0.40, 0.40], [0.42, 0.39], [0.44, 0.39], [0.46, 0.40], [0.44, 0.41], [0.42, 0.41],
+    [0.54, 0.40], [0.56, 0.39], [0.58, 0.39], [0.60, 0.40], [0.58, 0.41], [0.56, 0.41],
+], dtype=np.float32)
+
+def extract_eye_points(landmarks):
+    """ランドマークから両目の点だけを取り出し、(12, 2)のfloat32配列で返す"""
+    # 1フレームにつき1回だけランドマークの属性を読み出す
+    return np.array([(lm.x, lm.y) for lm in EYE_LANDMARK_GETTER(landmarks)],
+                    dtype=np.float32)
+
+# fastmathのうちninf/nnan（無限大・NaNが出ないと仮定する最適化）は外す
+@njit(cache=True, fastmath={'nsz', 'arcp', 'contract', 'afn', 'reassoc'})
+def calculate_eye_aspect_ratio(pts):
+    """両目のアスペクト比（EAR）をまとめて計算し、(左目EAR, 右目EAR)を返す
+    
+    pts: extract_eye_points()で取得した(12, 2)の座標配列（左目6点 + 右目6点）
+    """
+    # 左目: 垂直方向(1-5, 2-4)と水平方向(0-3)の距離
+    left_v1 = math.hypot(pts[1, 0] - pts[5, 0], pts[1, 1] - pts[5, 1])
+    left_v2 = math.hypot(pts[2, 0] - pts[4, 0], pts[2, 1] - pts[4, 1])
+    left_h = math.hypot(pts[0, 0] - pts[3, 0], pts[0, 1] - pts[3, 1])
+    
+    # 右目: 垂直方向(7-11, 8-10)と水平方向(6-9)の距離
+    right_v1 = math.hypot(pts[7, 0] - pts[11, 0], pts[7, 1] - pts[11, 1])
+    right_v2 = math.hypot(pts[8, 0] - pts[10, 0], pts[8, 1] - pts[10, 1])
+    right_h = math.hypot(pts[6, 0] - pts[9, 0], pts[6, 1] - pts[9, 1])
+    
+    # EAR計算（水平方向の距離が0の場合は従来どおりinfとする）
+    left_ear = (left_v1 + left_v2) / (2.0 * left_h) if left_h > 0.0 else math.inf
+    right_ear = (right_v1 + right_v2) / (2.0 * right_h) if right_h > 0.0 else math.inf
+    return left_ear, right_ear
+
+def put_while(queue, item, keep_going):
+    """keep_going()が真の間だけキューへの追加を試み、追加できたかを返す
+    
+    受け取る側のスレッドが止まっていても、putで固まらないようにするため。
+    """
+    while keep_going():
+        try:
+            queue.put(item, timeout=0.1)
+            return True
+        except Full:
+            pass
+    return False
 
-def calculate_eye_aspect_ratio(eye_landmarks):
-    """目のアスペクト比（EAR）を計算"""
-    # 垂直方向の距離
-    vertical_1 = np.linalg.norm(np.array([eye_landmarks[1].x, eye_landmarks[1].y]) - 
-                                 np.array([eye_landmarks[5].x, eye_landmarks[5].y]))
-    vertical_2 = np.linalg.norm(np.array([eye_landmarks[2].x, eye_landmarks[2].y]) - 
-                                 np.array([eye_landmarks[4].x, eye_landmarks[4].y]))
-    
-    # 水平方向の距離
-    horizontal = np.linalg.norm(np.array([eye_landmarks[0].x, eye_landmarks[0].y]) - 
-                                np.array([eye_landmarks[3].x, eye_landmarks[3].y]))
-    
-    # EAR計算
-    ear = (vertical_1 + vertical_2) / (2.0 * horizontal)
-    return ear
+def create_face_landmarker(model_path):
+    """Face Landmarkerを作成し、(landmarker, 実行デバイス名)を返す
+    
+    GPUデリゲートを優先し、使えない環境ではCPUで作成する。
+    VIDEOモードなので、どちらの場合もタイムスタンプは単調増加で渡す必要がある。
+    """
+    delegates = [('GPU', python.BaseOptions.Delegate.GPU),
+                 ('CPU', python.BaseOptions.Delegate.CPU)]
+    for name, delegate in delegates:
+        base_options = python.BaseOptions(model_asset_path=model_path, delegate=delegate)
+        options = vision.FaceLandmarkerOptions(
+            base_options=base_options,
+            running_mode=vision.RunningMode.VIDEO,
+            num_faces=1,
+            min_face_detection_confidence=0.5,
+            min_tracking_confidence=0.5)
+        try:
+            return vision.FaceLandmarker.create_from_options(options), name
+        except (RuntimeError, NotImplementedError):
+            if name == 'CPU':
+                raise
+
+def find_blinks(ear, threshold, min_frames):
+    """EARの列から瞬きの区間を探し、(開始インデックス, 終了インデックス)の配列を返す
+    
+    終了インデックスは目が開いた最初のサンプル（区間には含まない）。
+    目が開く前に列が終わった区間は瞬きとしない。
+    """
+    closed = ear < threshold
+    edges = np.diff(closed.view(np.int8), prepend=0, append=0)
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    keep = (ends - starts >= min_frames) & (ends < len(ear))
+    return starts[keep], ends[keep]
 
 def format_timestamp(milliseconds):
     """ミリ秒をHH:MM:SS.mmm形式に変換"""
@@ -69,13 +157,40 @@ def format_timestamp(milliseconds):
     return f"{hours:02d}:{minutes:02d}:{seconds:02d}.{ms:03d}"
 
 def main():
+    args = sys.argv[1:]
+    
+    # 起動オプション: --detect-width N で顔検出に使う画像の最大幅を変える（0で縮小しない）
+    detection_width = DETECTION_WIDTH
+    if '--detect-width' in args:
+        i = args.index('--detect-width')
+        value = args[i + 1] if i + 1 < len(args) else ''
+        try:
+            detection_width = int(value)
+        except ValueError:
+            detection_width = -1
+        if detection_width < 0:
+            print(f"エラー: --detect-width には0以上の整数を指定してください: {value}")
+            sys.exit(1)
+        del args[i:i + 2]
+    
     # コマンドライン引数から動画ファイルパスを取得
-    if len(sys.argv) < 2:
-        print("使い方: python video_blink_detection.py <動画ファイルパス>")
+    if len(args) < 1:
+        print("使い方: python video_blink_detection.py <動画ファイルパス> [デコード間隔] [--detect-width 幅]")
         print("例: python video_blink_detection.py sample_video.mp4")
+        print("    python video_blink_detection.py sample_video.mp4 2  # 2フレームに1回だけ解析")
+        print("    python video_blink_detection.py sample_video.mp4 --detect-width 0  # 縮小せずに検出")
         sys.exit(1)
     
-    video_path = sys.argv[1]
+    video_path = args[0]
+    
+    # デコード間隔（高FPSの動画では間引いても瞬きを取りこぼさない）
+    try:
+        decode_stride = int(args[1]) if len(args) > 1 else 1
+    except ValueError:
+        decode_stride = 0
+    if decode_stride < 1:
+        print(f"エラー: デコード間隔は1以上の整数で指定してください: {args[1]}")
+        sys.exit(1)
     
     # 動画ファイルの存在確認
     if not os.path.exists(video_path):
@@ -93,6 +208,7 @@ def main():
     fps = cap.get(cv2.CAP_PROP_FPS)
     total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
     duration = total_frames / fps
+    ms_per_frame = 1000.0 / fps
     width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
     height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
     
@@ -109,128 +225,243 @@ def main():
     video_name = os.path.splitext(os.path.basename(video_path))[0]
     csv_filename = f"blink_log_{video_name}_{timestamp}.csv"
     
-    csv_file = open(csv_filename, 'w', newline='')
-    csv_writer = csv.writer(csv_file)
-    csv_writer.writerow(['瞬き番号', 'タイムスタンプ', 'フレーム番号', '左目EAR', '右目EAR', '平均EAR'])
-    
-    # Face Landmarkerモデルの初期化
-    base_options = python.BaseOptions(model_asset_path='face_landmarker.task')
-    options = vision.FaceLandmarkerOptions(
-        base_options=base_options,
-        running_mode=vision.RunningMode.VIDEO,
-        num_faces=1,
-        min_face_detection_confidence=0.5,
-        min_tracking_confidence=0.5)
-    
     # 瞬き検出の設定
     EAR_THRESHOLD = 0.2  # この値以下で目が閉じていると判定
     CONSECUTIVE_FRAMES = 2  # この回数連続で閉じていたら瞬きと判定
     
+    # 間引いた場合は解析したフレーム数で判定する
+    min_closed_frames = max(CONSECUTIVE_FRAMES // decode_stride, 1)
+    
     blink_records = []  # 瞬きの記録
-    total_blinks = 0
-    frame_counter = 0
-    ear_values = []
     current_frame = 0
     
-    # 瞬き検出中の一時データ
-    blink_start_frame = None
-    blink_ear_values = []
+    # 顔検出用の画像サイズ
+    # ランドマークは正規化座標なので縦横比を保てばEARの尺度は同じだが、
+    # 縮小した画像ではランドマークの精度が下がるため、EARの値は元の解像度と完全には一致しない
+    if 0 < detection_width < width:
+        detect_width = detection_width
+        detect_height = max(int(height * detection_width / width), 1)
+    else:
+        detect_width, detect_height = width, height
+    print(f"顔検出の解像度: {detect_width}x{detect_height}")
+    
+    # 縮小・RGB変換用のバッファ（毎フレームの確保を避ける）
+    small_buf = np.empty((detect_height, detect_width, 3), dtype=np.uint8)
+    
+    # mp.Imageは受け取った配列を内部にコピーするので、RGBバッファは1枚を使い回してよい
+    rgb_buf = np.empty((detect_height, detect_width, 3), dtype=np.uint8)
+    
+    # EAR計算のJITコンパイルを処理開始前に済ませておく
+    calculate_eye_aspect_ratio(WARMUP_EYE_POINTS)
+    
+    # 読み込み → 顔検出 → EARの記録 をキューでつないで並行に処理する
+    # 各キューの終端にはNoneを流す
+    frame_queue = Queue(maxsize=8)   # (フレーム番号, タイムスタンプ, 画像)
+    result_queue = Queue(maxsize=8)  # (フレーム番号, タイムスタンプ, 左目EAR, 右目EAR)
+    
+    # スレッドで起きた例外（処理後にメインスレッドで送出する）と、読み込みを止める合図
+    thread_errors = []
+    stop_reading = Event()
+    
+    def read_frames():
+        """動画からフレームを読み込んでframe_queueに送る"""
+        nonlocal current_frame
+        keep_going = lambda: not stop_reading.is_set()
+        try:
+            while cap.isOpened():
+                # フレームを進めるだけならgrab()で済ませ、解析するフレームだけ画像に変換する
+                if not cap.grab():
+                    break
+                
+                frame_index = current_frame
+                current_frame += 1
+                if frame_index % decode_stride:
+                    continue
+                
+                success, image = cap.retrieve()
+                if not success:
+                    break
+                
+                # タイムスタンプをフレーム番号から計算（ミリ秒）
+                timestamp_ms = int(frame_index * ms_per_frame)
+                if not put_while(frame_queue, (current_frame, timestamp_ms, image), keep_going):
+                    break
+        except BaseException as e:
+            thread_errors.append(e)
+        finally:
+            put_while(frame_queue, None, keep_going)
+    
+    # 顔が検出されたフレームのEARを列ごとに記録する（瞬き判定は処理後にまとめて行う）
+    # EARの統計量もこの記録から処理後に計算する
+    # フレーム数の情報が0以下の動画もあるので、最低1フレーム分は確保する
+    capacity = max(total_frames // decode_stride + 1, 1)
+    ear_log = np.empty((capacity, 3))                   # 左目EAR, 右目EAR, 平均EAR
+    frame_log = np.empty((capacity, 2), dtype=np.int64)  # フレーム番号, タイムスタンプ
+    ear_log_size = 0
     
-    with vision.FaceLandmarker.create_from_options(options) as landmarker:
+    def record_ears():
+        """EARを受け取って記録する"""
+        nonlocal ear_log, frame_log, ear_log_size
+        processed_frames = 0
         
-        while cap.isOpened():
-            success, image = cap.read()
-            if not success:
-                break
-            
-            current_frame += 1
-            
-            # 進捗表示
-            if current_frame % 30 == 0:
-                progress = (current_frame / total_frames) * 100
-                print(f"処理中... {progress:.1f}% ({current_frame}/{total_frames} フレーム) - 瞬き検出: {total_blinks}回", end='\r')
-            
-            # BGRからRGBに変換
-            image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-            mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=image_rgb)
-            
-            # タイムスタンプを取得（ミリ秒）
-            timestamp_ms = int(cap.get(cv2.CAP_PROP_POS_MSEC))
-            
-            # 顔検出を実行
-            results = landmarker.detect_for_video(mp_image, timestamp_ms)
-            
-            # 顔が検出された場合
-            if results.face_landmarks:
-                landmarks = results.face_landmarks[0]
+        try:
+            while True:
+                item = result_queue.get()
+                if item is None:
+                    break
+                
+                frame_number, timestamp_ms, left_ear, right_ear = item
+                processed_frames += 1
                 
-                # 左目と右目のランドマークを取得
-                left_eye = [landmarks[i] for i in LEFT_EYE_INDEXES]
-                right_eye = [landmarks[i] for i in RIGHT_EYE_INDEXES]
+                # 進捗表示
+                if processed_frames % 30 == 0:
+                    # フレーム数の情報が0以下の動画では割合を出せないので、フレーム番号だけを表示する
+                    if total_frames > 0:
+                        progress = (frame_number / total_frames) * 100
+                        print(f"処理中... {progress:.1f}% ({frame_number}/{total_frames} フレーム)", end='\r')
+                    else:
+                        print(f"処理中... ({frame_number} フレーム)", end='\r')
+                
+                # 顔が検出されなかったフレーム
+                if left_ear is None:
+                    continue
                 
-                # 両目のEARを計算
-                left_ear = calculate_eye_aspect_ratio(left_eye)
-                right_ear = calculate_eye_aspect_ratio(right_eye)
                 ear = (left_ear + right_ear) / 2.0
-                ear_values.append(ear)
                 
-                # 瞬き検出
-                if ear < EAR_THRESHOLD:
-                    frame_counter += 1
-                    if blink_start_frame is None:
-                        blink_start_frame = current_frame
-                    blink_ear_values.append((left_ear, right_ear, ear))
-                else:
-                    if frame_counter >= CONSECUTIVE_FRAMES:
-                        total_blinks += 1
-                        
-                        # 瞬き中の平均EARを計算
-                        avg_left_ear = np.mean([v[0] for v in blink_ear_values])
-                        avg_right_ear = np.mean([v[1] for v in blink_ear_values])
-                        avg_ear = np.mean([v[2] for v in blink_ear_values])
-                        
-                        # 瞬きを記録
-                        blink_record = {
-                            'blink_number': total_blinks,
-                            'timestamp': format_timestamp(timestamp_ms),
-                            'frame': blink_start_frame,
-                            'left_ear': avg_left_ear,
-                            'right_ear': avg_right_ear,
-                            'avg_ear': avg_ear,
-                            'duration_frames': frame_counter
-                        }
-                        blink_records.append(blink_record)
-                        
-                        # CSVに書き込み
-                        csv_writer.writerow([
-                            total_blinks,
-                            format_timestamp(timestamp_ms),
-                            blink_start_frame,
-                            f"{avg_left_ear:.4f}",
-                            f"{avg_right_ear:.4f}",
-                            f"{avg_ear:.4f}"
-                        ])
+                # 動画のフレーム数の情報が実際より少なかった場合は領域を広げる
+                if ear_log_size == len(ear_log):
+                    grow = max(len(ear_log), 1024)
+                    ear_log = np.concatenate([ear_log, np.empty((grow, 3))])
+                    frame_log = np.concatenate([frame_log, np.empty((grow, 2), dtype=np.int64)])
+                
+                ear_log[ear_log_size] = (left_ear, right_ear, ear)
+                frame_log[ear_log_size] = (frame_number, timestamp_ms)
+                ear_log_size += 1
+        except BaseException as e:
+            # 例外はメインスレッドで送出する（メインスレッドはこのスレッドの終了を見て検出を止める）
+            thread_errors.append(e)
+    
+    # Face Landmarkerモデルの初期化
+    landmarker, delegate_name = create_face_landmarker('face_landmarker.task')
+    print(f"顔検出の実行デバイス: {delegate_name}\n")
+    
+    reader = Thread(target=read_frames, daemon=True)
+    recorder = Thread(target=record_ears, daemon=True)
+    reader.start()
+    recorder.start()
+    
+    try:
+        # 顔検出はこのスレッドだけで行う（VIDEOモードはタイムスタンプが単調増加である必要がある）
+        with landmarker:
+            
+            while True:
+                item = frame_queue.get()
+                if item is None:
+                    break
+                
+                frame_number, timestamp_ms, image = item
+                
+                # 検出用のサイズに縮小
+                if detect_width != width:
+                    small_buf = cv2.resize(image, (detect_width, detect_height), dst=small_buf,
+                                           interpolation=cv2.INTER_AREA)
+                    image = small_buf
+                
+                # BGRからRGBに変換（確保済みのバッファに書き込む）
+                # 画像の大きさがバッファと違うとOpenCVが確保し直すので、戻り値を次のバッファにする
+                rgb_buf = cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=rgb_buf)
+                mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb_buf)
+                
+                # 顔検出を実行
+                results = landmarker.detect_for_video(mp_image, timestamp_ms)
+                
+                # 顔が検出された場合
+                if results.face_landmarks:
+                    landmarks = results.face_landmarks[0]
+                    
+                    # 両目のランドマーク座標を配列として取得
+                    eye_pts = extract_eye_points(landmarks)
                     
-                    # リセット
-                    frame_counter = 0
-                    blink_start_frame = None
-                    blink_ear_values = []
+                    # 両目のEARを計算
+                    left_ear, right_ear = calculate_eye_aspect_ratio(eye_pts)
+                else:
+                    left_ear = right_ear = None
+                
+                # 記録側のスレッドが止まっていたら検出も止める
+                if not put_while(result_queue, (frame_number, timestamp_ms, left_ear, right_ear),
+                                 recorder.is_alive):
+                    break
+    finally:
+        # 読み込みを止めて、両方のスレッドの終了を待つ
+        stop_reading.set()
+        put_while(result_queue, None, recorder.is_alive)
+        reader.join()
+        recorder.join()
+        
+        # リソースの解放（読み込み側のスレッドが止まってから閉じる）
+        cap.release()
+    
+    # スレッドで起きた例外を送出
+    if thread_errors:
+        raise thread_errors[0]
+    
+    # フレーム数の情報が0以下の動画は、実際に読み込んだフレーム数から再生時間を求め直す
+    if total_frames <= 0:
+        duration = current_frame / fps
+    
+    # 記録したEAR列から瞬きを判定
+    ear_log = ear_log[:ear_log_size]
+    frame_log = frame_log[:ear_log_size]
+    starts, ends = find_blinks(ear_log[:, 2], EAR_THRESHOLD, min_closed_frames)
+    blink_lengths = ends - starts
+    
+    # EAR統計
+    ear_count = len(ear_log)
+    if ear_count:
+        ear_mean = np.mean(ear_log[:, 2])
+        ear_min = np.min(ear_log[:, 2])
+        ear_max = np.max(ear_log[:, 2])
+        ear_std = np.std(ear_log[:, 2])
+    total_blinks = len(starts)
+    
+    if total_blinks > 0:
+        # 区間ごとの合計を一度に求めて平均EARを計算（奇数番目は区間の間の合計なので捨てる）
+        bounds = np.column_stack([starts, ends]).ravel()
+        blink_means = np.add.reduceat(ear_log, bounds)[::2] / blink_lengths[:, None]
+        
+        for i in range(total_blinks):
+            # 瞬きを記録（タイムスタンプは目が開いたフレームのもの）
+            blink_records.append({
+                'blink_number': i + 1,
+                'timestamp': format_timestamp(int(frame_log[ends[i], 1])),
+                'frame': int(frame_log[starts[i], 0]),
+                'left_ear': float(blink_means[i, 0]),
+                'right_ear': float(blink_means[i, 1]),
+                'avg_ear': float(blink_means[i, 2]),
+                'duration_frames': int(blink_lengths[i]) * decode_stride
+            })
     
-    # リソースの解放
-    cap.release()
-    csv_file.close()
+    # CSVに書き込み（処理が最後まで終わったときだけファイルを作る）
+    # 瞬きごとの行は整形済みのバイト列にして、まとめて書き込む
+    with open(csv_filename, 'wb') as csv_file:
+        # ExcelでもUTF-8と認識されるよう、先頭にBOMを付ける（utf-8-sig）
+        csv_file.write("瞬き番号,タイムスタンプ,フレーム番号,左目EAR,右目EAR,平均EAR\r\n".encode('utf-8-sig'))
+        csv_file.write(b"".join(
+            f"{record['blink_number']},{record['timestamp']},{record['frame']},"
+            f"{record['left_ear']:.4f},{record['right_ear']:.4f},{record['avg_ear']:.4f}\r\n".encode('utf-8')
+            for record in blink_records))
     
     # 結果の表示
     print(f"\n\n=== 処理完了 ===")
     print(f"総フレーム数: {current_frame}")
     print(f"総瞬き回数: {total_blinks}")
     
-    if ear_values:
+    if ear_count:
         print(f"\n=== EAR統計情報 ===")
-        print(f"平均EAR: {np.mean(ear_values):.4f}")
-        print(f"最小EAR: {np.min(ear_values):.4f}")
-        print(f"最大EAR: {np.max(ear_values):.4f}")
-        print(f"標準偏差: {np.std(ear_values):.4f}")
+        print(f"平均EAR: {ear_mean:.4f}")
+        print(f"最小EAR: {ear_min:.4f}")
+        print(f"最大EAR: {ear_max:.4f}")
+        print(f"標準偏差: {ear_std:.4f}")
     
     if total_blinks > 0:
         print(f"\n=== 瞬き詳細 ===")
@@ -252,6 +483,7 @@ def main():
         
         f.write("--- 動画情報 ---\n")
         f.write(f"解像度: {width}x{height}\n")
+        f.write(f"顔検出の解像度: {detect_width}x{detect_height}\n")
         f.write(f"FPS: {fps:.2f}\n")
         f.write(f"総フレーム数: {total_frames}\n")
         f.write(f"再生時間: {format_timestamp(duration * 1000)}\n\n")
@@ -262,19 +494,20 @@ def main():
             f.write(f"瞬き頻度: {total_blinks / (duration / 60):.2f} 回/分\n")
         f.write(f"\n")
         
-        if ear_values:
+        if ear_count:
             f.write("--- EAR統計 ---\n")
-            f.write(f"平均EAR: {np.mean(ear_values):.4f}\n")
-            f.write(f"最小EAR: {np.min(ear_values):.4f}\n")
-            f.write(f"最大EAR: {np.max(ear_values):.4f}\n")
-            f.write(f"標準偏差: {np.std(ear_values):.4f}\n\n")
+            f.write(f"平均EAR: {ear_mean:.4f}\n")
+            f.write(f"最小EAR: {ear_min:.4f}\n")
+            f.write(f"最大EAR: {ear_max:.4f}\n")
+            f.write(f"標準偏差: {ear_std:.4f}\n\n")
         
         f.write("--- 全瞬き記録 ---\n")
         f.write(f"{'No.':<5} {'タイムスタンプ':<15} {'フレーム':<10} {'左目EAR':<12} {'右目EAR':<12} {'平均EAR':<12}\n")
         f.write("-" * 80 + "\n")
-        for record in blink_records:
-            f.write(f"{record['blink_number']:<5} {record['timestamp']:<15} {record['frame']:<10} "
-                   f"{record['left_ear']:<12.4f} {record['right_ear']:<12.4f} {record['avg_ear']:<12.4f}\n")
+        f.write("".join(
+            f"{record['blink_number']:<5} {record['timestamp']:<15} {record['frame']:<10} "
+            f"{record['left_ear']:<12.4f} {record['right_ear']:<12.4f} {record['avg_ear']:<12.4f}\n"
+            for record in blink_records))
     
     print(f"詳細レポートを保存しました: {report_filename}")
 